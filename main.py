@@ -1,4 +1,6 @@
-import os, re, json, requests, time
+import os, re, json, requests, time, threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import flet as ft
 from typing import Any, Optional, Dict, List
 from pathlib import Path
@@ -16,8 +18,560 @@ class llv(IntEnum):
     CRITICAL = 4   
     def __str__(self):
         return self.name
+
+class TargetIndex:
+    """目标目录索引: (作品ID, 页码, 扩展名) -> 已存在的文件路径"""
+    name_re = re.compile(r"^(\d+)(?:_p(\d+))?$")
+
+    def __init__(self):
+        self.entries: Dict[tuple, List[Path]] = {}
+        self.paths = set()
+
+    @staticmethod
+    def inner_dir(root: str, path: Optional[str]) -> Optional[str]:
+        """path位于root之内(含相同)时，返回其在root遍历路径下的写法，否则返回None"""
+        if not path:
+            return None
+        try:
+            rel = os.path.relpath(os.path.realpath(path), os.path.realpath(root))
+        except ValueError:  # 不在同一驱动器
+            return None
+        if rel == os.pardir or rel.startswith(os.pardir + os.sep):
+            return None
+        return os.path.normpath(os.path.join(root, rel))
+
+    @classmethod
+    def key_of(cls, filename: str) -> Optional[tuple]:
+        """从目标文件名解析索引键，扩展名不同视为不同文件"""
+        path = Path(filename)
+        match = cls.name_re.match(path.stem)
+        if not match:
+            return None
+        return (match.group(1), int(match.group(2) or 0), path.suffix.lower())
+
+    def build(self, root: str, extensions: List[str], exclude: Optional[str] = None) -> int:
+        """使用scandir遍历目标目录建立索引，exclude(源目录)下的文件不视为已整理的作品"""
+        self.entries.clear()
+        self.paths.clear()
+        exts = {ext.lower() for ext in extensions}
+        excluded = self.inner_dir(root, exclude)
+        stack = [(root, excluded == os.path.normpath(root))]
+        while stack:
+            folder, in_source = stack.pop()
+            try:
+                with os.scandir(folder) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append((entry.path, in_source or os.path.normpath(entry.path) == excluded))
+                        elif os.path.splitext(entry.name)[1].lower() in exts:
+                            self.add(Path(entry.path), placed=not in_source)
+            except OSError:
+                continue
+        return len(self.paths)
+
+    def add(self, path: Path, placed: bool = True):
+        """登记一个文件；源文件(placed=False)只用于判断路径是否存在"""
+        key = self.key_of(path.name)
+        if key is None or path in self.paths:
+            return
+        self.paths.add(path)
+        if placed:
+            self.entries.setdefault(key, []).append(path)
+
+    def remove(self, path: Path):
+        """移除一个文件记录"""
+        key = self.key_of(path.name)
+        if path not in self.paths:
+            return
+        self.paths.discard(path)
+        paths = self.entries.get(key, [])
+        if path in paths:
+            paths.remove(path)
+        if not paths:
+            self.entries.pop(key, None)
+
+    def exists(self, path: Path) -> bool:
+        return path in self.paths
+
+    def elsewhere(self, path: Path) -> List[Path]:
+        """查找同一作品页在其他位置的文件"""
+        key = self.key_of(path.name)
+        if key is None:
+            return []
+        return [p for p in self.entries.get(key, []) if p != path]
+
+class RateLimiter:
+    """按最小间隔发放请求许可(线程安全)"""
+    def __init__(self, interval: float):
+        self.interval = max(0.0, float(interval))
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self, not_before: float = 0.0) -> float:
+        """预约下一个请求时间点，返回需要等待的秒数"""
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot, not_before)
+            self.next_slot = slot + self.interval
+        return slot - now
+
+    def wait(self):
+        """等待直到允许发出下一个请求"""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+class CookieSession:
+    """Cookie池中的单个账号会话"""
+    def __init__(self, label: str, cookie: str, interval: float):
+        self.label = label
+        self.cookie = cookie
+        self.limiter = RateLimiter(interval)
+        self.http = requests.Session()
+        self.cooldown_until = 0.0
+        self.auth_failures = 0
+        self.alive = True
+
+class CookiePool:
+    """多账号Cookie池：每个会话独立限速，429后冷却，失效的Cookie自动移出轮换"""
+    def __init__(self, cookies: Any, interval: float, cooldown: float, max_auth_failures: int):
+        self.sessions = [
+            CookieSession(f"#{index}", cookie, interval)
+            for index, cookie in enumerate(self.parse(cookies), 1)
+        ]
+        self.cooldown = cooldown
+        self.max_auth_failures = max(1, max_auth_failures)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def parse(cookies: Any) -> List[str]:
+        """解析Cookie配置，支持列表或以|、换行分隔的字符串"""
+        if isinstance(cookies, str):
+            cookies = re.split(r"[|\n]", cookies)
+        if not isinstance(cookies, list):
+            return []
+        return [str(cookie).strip() for cookie in cookies if str(cookie).strip()]
+
+    def alive_count(self) -> int:
+        return sum(1 for session in self.sessions if session.alive)
+
+    def available(self, exclude: set) -> bool:
+        """是否还有未被排除的健康会话"""
+        with self.lock:
+            return any(session.alive and session not in exclude for session in self.sessions)
+
+    def acquire(self, exclude: Optional[set] = None) -> Optional[CookieSession]:
+        """选择最早可用的健康会话并等待其请求时间点，无可用会话时返回None"""
+        with self.lock:
+            alive = [session for session in self.sessions if session.alive and session not in (exclude or ())]
+            if not alive:
+                return None
+            session = min(alive, key=lambda s: max(s.cooldown_until, s.limiter.next_slot))
+            delay = session.limiter.reserve(session.cooldown_until)
+        if delay > 0:
+            time.sleep(delay)
+        return session
+
+    def report(self, session: CookieSession, status: int, retry_after: Optional[float] = None):
+        """记录会话的响应状态；401/403可能只是作品受限，不在此计入认证失败"""
+        with self.lock:
+            if status == 429:
+                session.cooldown_until = time.monotonic() + (retry_after if retry_after is not None else self.cooldown)
+            elif status in (200, 304):
+                session.auth_failures = 0
+
+    def penalize(self, session: CookieSession) -> bool:
+        """其他会话能获取的作品该会话却返回401/403时计入认证失败，被移出轮换时返回True"""
+        with self.lock:
+            session.auth_failures += 1
+            if session.auth_failures > 1:
+                session.cooldown_until = time.monotonic() + self.cooldown
+            if session.alive and session.auth_failures >= self.max_auth_failures:
+                session.alive = False
+                return True
+            return False
+
+class CircuitBreaker:
+    """API熔断器：错误率过高时停止请求，冷却后以单个探测请求试探恢复"""
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+    PASS = object()  # 闭合状态下放行请求的令牌
+
+    def __init__(self, error_rate: float, window: int, cooldown: float):
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.min_requests = max(1, window // 2)  # 样本太少时不判断
+        self.outcomes = deque(maxlen=max(1, window))  # None为成功，否则为失败类型
+        self.state = self.CLOSED
+        self.reason = None
+        self.opened_at = 0.0
+        self.probe = None  # 当前探测请求持有的令牌
+        self.lock = threading.Lock()
+
+    def allow(self) -> Optional[object]:
+        """申请发出请求，返回令牌；不允许时返回None，半开状态下只发放一个探测令牌"""
+        with self.lock:
+            if self.state == self.CLOSED:
+                return self.PASS
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self.probe = None
+            if self.state == self.HALF_OPEN and self.probe is None:
+                self.probe = object()
+                return self.probe
+            return None
+
+    def wait(self) -> object:
+        """阻塞直到允许发出请求，返回令牌"""
+        while True:
+            token = self.allow()
+            if token is not None:
+                return token
+            with self.lock:
+                remaining = self.cooldown - (time.monotonic() - self.opened_at)
+            time.sleep(min(max(remaining, 0.1), 1.0))
+
+    def release(self, token: object):
+        """请求结束时归还令牌，未记录结果的探测令牌会被收回以便再次探测"""
+        with self.lock:
+            if token is self.probe:
+                self.probe = None
+
+    def record(self, token: object, failure: Optional[str] = None) -> Optional[str]:
+        """记录请求结果(None/"error"/"auth")，状态变化时返回新状态"""
+        with self.lock:
+            # 只有探测请求的结果决定半开状态的去向
+            if self.state == self.HALF_OPEN and token is self.probe:
+                self.probe = None
+                if failure is None:
+                    self.state = self.CLOSED
+                    self.reason = None
+                    self.outcomes.clear()
+                    return self.CLOSED
+                self.trip(failure)
+                return self.OPEN
+            
+            self.outcomes.append(failure)
+            if self.state != self.CLOSED or len(self.outcomes) < self.min_requests:
+                return None
+            failures = [f for f in self.outcomes if f]
+            if not failures or len(failures) / len(self.outcomes) < self.error_rate:
+                return None
+            auth_failures = failures.count("auth")
+            self.trip("auth" if auth_failures * 2 >= len(failures) else "error")
+            return self.OPEN
+
+    def trip(self, reason: str):
+        self.state = self.OPEN
+        self.reason = reason
+        self.opened_at = time.monotonic()
+
+class RunProfiler:
+    """整理任务性能分析：cProfile、调用栈采样及tracemalloc内存快照"""
+    def __init__(self, interval: float = 0.005, top_n: int = 30):
+        self.interval = interval
+        self.top_n = top_n
+        self.stacks: Dict[str, int] = {}
+        self.stop_event = threading.Event()
+        self.profile = None
+        self.sampler = None
+        self.tracing = False  # 是否由本分析器开启了tracemalloc
+
+    def start(self):
+        """开始分析，中途失败时已开启的部分由stop()清理"""
+        import cProfile, tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.tracing = True
+        self.sampler = threading.Thread(target=self.sample, name="pixsense-profiler", daemon=True)
+        self.sampler.start()
+        # cProfile只统计当前线程，工作线程由采样器覆盖
+        profile = cProfile.Profile()
+        profile.enable()
+        self.profile = profile
+
+    def sample(self):
+        """定时采样所有线程的调用栈"""
+        import sys
+        own_id = threading.get_ident()
+        names = {}
+        while not self.stop_event.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                frames.append(names.get(thread_id, str(thread_id)))
+                key = ";".join(reversed(frames))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def stop(self, output_dir: Path) -> List[Path]:
+        """停止分析并写出已收集的结果文件，返回文件路径；可在部分启动后调用"""
+        import pstats, tracemalloc
+        profile, self.profile = self.profile, None
+        if profile:
+            profile.disable()
+        self.stop_event.set()
+        if self.sampler:
+            self.sampler.join()
+            self.sampler = None
+        snapshot = None
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+        if self.tracing:
+            tracemalloc.stop()
+            self.tracing = False
+
+        output_dir.mkdir(parents=True, exist_ok=True)
+        base = output_dir / f"pixsense-profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        paths = []
+        if profile:
+            pstats_path = base.with_suffix(".pstats")
+            pstats.Stats(profile).dump_stats(str(pstats_path))
+            paths.append(pstats_path)
+        if self.stacks:
+            collapsed_path = base.with_suffix(".collapsed")
+            with open(collapsed_path, "w", encoding="utf-8") as f:
+                for stack, count in sorted(self.stacks.items()):
+                    f.write(f"{stack} {count}\n")
+            paths.append(collapsed_path)
+        if snapshot:
+            alloc_path = base.with_suffix(".alloc.txt")
+            with open(alloc_path, "w", encoding="utf-8") as f:
+                f.write(f"current: {current / 1024:.1f} KiB, peak: {peak / 1024:.1f} KiB\n\n")
+                for index, stat in enumerate(snapshot.statistics("lineno")[:self.top_n], 1):
+                    f.write(f"#{index}: {stat}\n")
+            paths.append(alloc_path)
+        return paths
+
+class LibraryCatalog:
+    """已整理文件的SQLite目录，记录作品信息、来源/目标路径及内容哈希"""
+    schema = """
+        CREATE TABLE IF NOT EXISTS files (
+            target_path TEXT PRIMARY KEY,
+            illust_id TEXT NOT NULL,
+            page INTEGER NOT NULL DEFAULT 0,
+            user_id TEXT,
+            user_name TEXT,
+            title TEXT,
+            create_date TEXT,
+            bookmark_count INTEGER,
+            source_path TEXT,
+            content_hash TEXT,
+            size INTEGER,
+            mtime REAL,
+            metadata TEXT,
+            updated_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_files_illust ON files(illust_id, page);
+        CREATE INDEX IF NOT EXISTS idx_files_user_id ON files(user_id);
+        CREATE INDEX IF NOT EXISTS idx_files_user_name ON files(user_name);
+        CREATE INDEX IF NOT EXISTS idx_files_date ON files(create_date);
+        CREATE TABLE IF NOT EXISTS tags (
+            tag TEXT NOT NULL,
+            target_path TEXT NOT NULL,
+            PRIMARY KEY (tag, target_path)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_tags_path ON tags(target_path);
+    """
+
+    def __init__(self, db_path: str):
+        import sqlite3
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(self.schema)
+        self.lock = threading.Lock()
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+
+    @staticmethod
+    def file_hash(path: Path) -> str:
+        """计算文件内容哈希"""
+        import hashlib
+        digest = hashlib.blake2b(digest_size=20)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def meta_columns(metadata: Dict) -> tuple:
+        """作品信息对应的列值: user_id, user_name, title, create_date, bookmark_count, metadata"""
+        return (
+            str(metadata.get("userId", "")), str(metadata.get("userName", "")),
+            str(metadata.get("illustTitle", "")), str(metadata.get("createDate", "")),
+            int(metadata.get("bookmarkCount", 0) or 0), json.dumps(metadata, ensure_ascii=False)
+        )
+
+    def write_tags(self, target_path: Path, metadata: Dict):
+        """重写文件的标签记录，调用方需持有锁"""
+        tags = [tag.get("tag", "") for tag in metadata.get("tags", {}).get("tags", []) if isinstance(tag, dict)]
+        self.conn.execute("DELETE FROM tags WHERE target_path = ?", (str(target_path),))
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO tags VALUES (?, ?)",
+            [(tag, str(target_path)) for tag in tags if tag]
+        )
+
+    def record(self, target_path: Path, source_path: Optional[Path], page: int, metadata: Dict):
+        """登记一个刚放置的文件，文件未变化时复用已有哈希"""
+        stat = target_path.stat()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT content_hash, size, mtime FROM files WHERE target_path = ?",
+                (str(target_path),)
+            ).fetchone()
+        if row and row["size"] == stat.st_size and row["mtime"] == stat.st_mtime:
+            content_hash = row["content_hash"]
+        else:
+            content_hash = self.file_hash(target_path)
+        user_id, user_name, title, create_date, bookmark_count, metadata_json = self.meta_columns(metadata)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    str(target_path), str(metadata.get("illustId", "")), page,
+                    user_id, user_name, title, create_date, bookmark_count,
+                    str(source_path) if source_path else None, content_hash,
+                    stat.st_size, stat.st_mtime, metadata_json, time.time()
+                )
+            )
+            self.write_tags(target_path, metadata)
+
+    def refresh(self, target_path: Path, metadata: Dict):
+        """更新已有文件的作品信息，保留来源、页码及哈希；尚未登记时按目标文件名登记"""
+        with self.lock:
+            cursor = self.conn.execute(
+                "UPDATE files SET user_id = ?, user_name = ?, title = ?, create_date = ?, "
+                "bookmark_count = ?, metadata = ?, updated_at = ? WHERE target_path = ?",
+                (*self.meta_columns(metadata), time.time(), str(target_path))
+            )
+            if cursor.rowcount:
+                self.write_tags(target_path, metadata)
+                return
+        # 来源未知，页码取自目标文件名
+        key = TargetIndex.key_of(target_path.name)
+        self.record(target_path, None, key[1] if key else 0, metadata)
+
+    def move(self, old_path: Path, new_path: Path, mover=None):
+        """更新文件的目标路径并在同一事务中执行mover移动文件，移动失败时回滚"""
+        with self.lock:
+            # 先提交之前的登记，回滚时只撤销本次移动
+            self.conn.commit()
+            try:
+                # 清除新路径上残留的旧记录
+                self.conn.execute("DELETE FROM files WHERE target_path = ?", (str(new_path),))
+                self.conn.execute("DELETE FROM tags WHERE target_path = ?", (str(new_path),))
+                self.conn.execute(
+                    "UPDATE files SET target_path = ?, updated_at = ? WHERE target_path = ?",
+                    (str(new_path), time.time(), str(old_path))
+                )
+                self.conn.execute(
+                    "UPDATE tags SET target_path = ? WHERE target_path = ?",
+                    (str(new_path), str(old_path))
+                )
+                if mover:
+                    mover()
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+
+    def remove(self, target_path: Path):
+        """删除文件的目录记录"""
+        with self.lock:
+            self.conn.execute("DELETE FROM files WHERE target_path = ?", (str(target_path),))
+            self.conn.execute("DELETE FROM tags WHERE target_path = ?", (str(target_path),))
+            self.conn.commit()
+
+    def all_files(self) -> List[Dict]:
+        with self.lock:
+            return [dict(row) for row in self.conn.execute("SELECT * FROM files ORDER BY target_path")]
+
+    def by_user(self, user: str) -> List[Dict]:
+        """按用户ID或用户名查询"""
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(
+                "SELECT * FROM files WHERE user_id = ? OR user_name = ? ORDER BY target_path",
+                (user, user)
+            )]
+
+    def by_tag(self, tag: str) -> List[Dict]:
+        """按标签查询"""
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(
+                "SELECT files.* FROM tags JOIN files USING (target_path) WHERE tags.tag = ? ORDER BY target_path",
+                (tag,)
+            )]
+
+    def by_date(self, start: str, end: str) -> List[Dict]:
+        """按投稿日期范围查询，日期格式为YYYY-MM-DD"""
+        # createDate为ISO格式字符串，结束日期后追加\uffff以包含当天所有时间
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(
+                "SELECT * FROM files WHERE create_date >= ? AND create_date <= ? ORDER BY create_date",
+                (start, end + "\uffff")
+            )]
+
+class MetadataCache:
+    """作品信息本地缓存，保存响应体及ETag/Last-Modified用于条件请求"""
+    def __init__(self, cache_dir: str, ttl_hours: float):
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl_hours * 3600
+
+    def path_of(self, illust_id: str) -> Path:
+        return self.cache_dir / f"{illust_id}.json"
+
+    def get(self, illust_id: str) -> Optional[Dict]:
+        """读取缓存条目"""
+        try:
+            with open(self.path_of(illust_id), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            return entry if isinstance(entry, dict) and "body" in entry else None
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self, entry: Optional[Dict]) -> bool:
+        return bool(entry) and time.time() - entry.get("fetched_at", 0) < self.ttl
+
+    def put(self, illust_id: str, body: Any, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        """写入缓存条目"""
+        self.write(illust_id, {
+            "fetched_at": time.time(),
+            "etag": etag,
+            "last_modified": last_modified,
+            "body": body
+        })
+
+    def touch(self, illust_id: str, entry: Dict):
+        """304响应后延长缓存有效期"""
+        entry["fetched_at"] = time.time()
+        self.write(illust_id, entry)
+
+    def write(self, illust_id: str, entry: Dict):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self.path_of(illust_id)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
     
 class PixivImageOrganizer:
+    place_batch_size = 64  # 联网获取的文件攒够一批后按目录分组放置
+    query_result_limit = 200  # 目录查询结果最多显示条数
+
     def __init__(self, page: ft.Page):
         self.page = page
         self.page.title = _("PixSense - Pixiv图片分类整理工具")
@@ -26,6 +580,9 @@ class PixivImageOrganizer:
         self.page.scroll = "adaptive"
         
         self.log_output = ft.ListView(expand=True, spacing=10)  
+        self.target_index = TargetIndex()
+        self.catalog = None
+        self.log_lock = threading.RLock()
 
         # 配置项
         self.config = {
@@ -34,6 +591,7 @@ class PixivImageOrganizer:
             "filename_rule": "{id}",
             "folder_structure": "{user}/{title}",
             "overwrite_existing": False,
+            "relocate_existing": False,  # 作品已整理到其他目录时移动到新位置
             "pixiv_cookie": "",
             "file_extensions": [".jpg", ".png", ".jpeg", ".gif"],
             "max_retries": 5,  # 最大重试次数
@@ -44,16 +602,33 @@ class PixivImageOrganizer:
             "retry_on_429": True,  # 是否在429时自动重试
             "retry_on_timeout": True,  # 是否在超时时自动重试
             "thread_count": 5,
+            "request_interval": 1.0,  # 同一Cookie两次API请求之间的最小间隔(秒)
+            "cookie_cooldown": 60,  # Cookie收到429/403后的冷却时间(秒)
+            "cookie_max_auth_failures": 3,  # Cookie连续认证失败多少次后移出轮换
+            "breaker_error_rate": 0.5,  # 熔断错误率阈值
+            "breaker_window": 20,  # 统计错误率的最近请求数
+            "breaker_cooldown": 60,  # 熔断后探测恢复的间隔(秒)
+            "breaker_action": "pause",  # 熔断时的处理: pause暂停等待恢复, cache_only仅放置已缓存的作品
             "id_regex_pattern": r"(\d+)",  # 默认匹配连续数字
             "log_to_file": True,  # 新增：是否记录日志到文件
             "log_file_path": "pixsense.log",  # 新增：日志文件路径
             "log_level": "INFO",  # 新增：默认日志级别
             "clear_log_on_startup": True,  # 新增：启动时清空日志
-            "tag_separator": ", "  # 标签连接符
+            "enable_profiling": False,  # 整理时记录性能分析数据，输出到日志文件所在目录
+            "catalog_path": "pixsense.db",  # 已整理文件目录数据库
+            "tag_separator": ", ",  # 标签连接符
+            "metadata_cache_dir": "metadata_cache",  # 作品信息缓存目录
+            "metadata_cache_ttl_hours": 168  # 缓存有效期(小时)，过期后发送条件请求刷新
         }
         
         # 加载保存的配置
         self.loadc()
+        self.metadata_cache = MetadataCache(
+            self.config["metadata_cache_dir"],
+            self.config["metadata_cache_ttl_hours"]
+        )
+        self.cookie_pool = self.make_cookie_pool()
+        self.breaker = self.make_breaker()
 
         # UI元素
         self.setui()
@@ -136,7 +711,8 @@ class PixivImageOrganizer:
         # Pixiv Cookie
         self.pixiv_cookie_field = ft.TextField(
             label=_("Pixiv Cookie (PHPSESSID=...)"),
-            value=self.config["pixiv_cookie"],
+            value=" | ".join(CookiePool.parse(self.config["pixiv_cookie"])),
+            hint_text=_("多个账号的Cookie用 | 分隔"),
             password=True,
             can_reveal_password=True,
             expand=True
@@ -155,6 +731,11 @@ class PixivImageOrganizer:
             label=_("覆盖已存在的文件"),
             value=self.config["overwrite_existing"]
         )
+
+        self.relocate_check = ft.Checkbox(
+            label=_("移动已整理到其他目录的作品"),
+            value=self.config["relocate_existing"]
+        )
         
         # 重试配置行
         self.max_retries_field = ft.TextField(
@@ -225,7 +806,54 @@ class PixivImageOrganizer:
         self.thread_count_field = ft.TextField(
             label=_("线程数"),
             value=str(self.config["thread_count"]),
-            input_filter=ft.InputFilter(allow=True, regex_string=r"[0-9]", replacement_string="")
+            input_filter=ft.InputFilter(allow=True, regex_string=r"[0-9]", replacement_string=""),
+            width=120
+        )
+
+        self.request_interval_field = ft.TextField(
+            label=_("请求间隔(秒)"),
+            value=str(self.config["request_interval"]),
+            input_filter=ft.InputFilter(allow=True, regex_string=r"[0-9.]", replacement_string=""),
+            width=120
+        )
+
+
+        # 熔断配置
+        self.breaker_error_rate_field = ft.TextField(
+            label=_("熔断错误率"),
+            value=str(self.config["breaker_error_rate"]),
+            input_filter=ft.InputFilter(allow=True, regex_string=r"[0-9.]", replacement_string=""),
+            width=120
+        )
+
+        self.breaker_window_field = ft.TextField(
+            label=_("统计请求数"),
+            value=str(self.config["breaker_window"]),
+            input_filter=ft.InputFilter(allow=True, regex_string=r"[0-9]", replacement_string=""),
+            width=120
+        )
+
+        self.breaker_cooldown_field = ft.TextField(
+            label=_("探测间隔(秒)"),
+            value=str(self.config["breaker_cooldown"]),
+            input_filter=ft.InputFilter(allow=True, regex_string=r"[0-9]", replacement_string=""),
+            width=120
+        )
+
+        self.breaker_action_dropdown = ft.Dropdown(
+            label=_("熔断时"),
+            value=self.config["breaker_action"],
+            options=[
+                ft.dropdown.Option("pause", _("暂停等待恢复")),
+                ft.dropdown.Option("cache_only", _("仅放置已缓存的作品")),
+            ],
+            width=200
+        )
+        self.breaker_help = ft.Text(  # 添加工具提示
+            value="(?)", 
+            size=12, 
+            color=ft.Colors.BLUE,
+            tooltip=_("最近请求的失败比例超过阈值时停止请求，之后每隔探测间隔发出单个请求检测是否恢复")
         )
         
         # 日志输出
@@ -274,6 +902,45 @@ class PixivImageOrganizer:
             value=self.config.get("clear_log_on_startup", True)
         )
         
+        self.profiling_check = ft.Checkbox(
+            label=_("性能分析"),
+            value=self.config["enable_profiling"]
+        )
+        self.profiling_help = ft.Text(  # 添加工具提示
+            value="(?)", 
+            size=12, 
+            color=ft.Colors.BLUE,
+            tooltip=_("启用后，整理时记录CPU调用统计(.pstats)、火焰图调用栈(.collapsed)和内存分配报告(.alloc.txt)，保存在日志文件所在目录")
+        )
+        
+        self.relayout_button = ft.ElevatedButton(
+            _("按当前结构重新布局"),
+            on_click=self.relayout,
+            icon=ft.Icons.DRIVE_FILE_MOVE
+        )
+
+        # 目录查询
+        self.catalog_query_dropdown = ft.Dropdown(
+            label=_("查询方式"),
+            value="user",
+            options=[
+                ft.dropdown.Option("user", _("用户")),
+                ft.dropdown.Option("tag", _("标签")),
+                ft.dropdown.Option("date", _("日期范围")),
+            ],
+            width=150
+        )
+        self.catalog_query_field = ft.TextField(
+            label=_("查询内容"),
+            hint_text=_("如: 用户ID/用户名、标签 或 2024-01-01~2024-12-31"),
+            expand=True
+        )
+        self.catalog_query_button = ft.ElevatedButton(
+            _("查询目录"),
+            on_click=self.query_catalog,
+            icon=ft.Icons.SEARCH
+        )
+        
         self.clear_log_button = ft.ElevatedButton(
             _("手动清空日志"),
             on_click=lambda _: self.clear_log_file(),
@@ -316,18 +983,38 @@ class PixivImageOrganizer:
                     wrap=False,  # 禁用自动换行
                     scroll=True  # 启用水平滚动
                 ),
+                ft.Row([  # 并发配置行
+                    ft.Text(_("并发配置:"), width=100),
+                    self.thread_count_field,
+                    self.request_interval_field
+                ]),
+                ft.Row([  # 熔断配置行
+                    ft.Text(_("熔断配置:"), width=100),
+                    self.breaker_error_rate_field,
+                    self.breaker_window_field,
+                    self.breaker_cooldown_field,
+                    ft.Row([self.breaker_action_dropdown, self.breaker_help], spacing=0)
+                ]),
                 ft.Row([  # 新增日志配置行
                     self.log_to_file_check,
                     self.log_file_path_field,
                     self.log_level_dropdown
                 ]),
                 self.overwrite_check,
+                self.relocate_check,
                 self.clear_log_check,
+                ft.Row([self.profiling_check, self.profiling_help], spacing=0),
                 ft.Row([
                     self.start_button,
+                    self.relayout_button,
                     self.savec_button,
                     self.clear_log_button
                 ]),
+                ft.Row([  # 目录查询行
+                    self.catalog_query_dropdown,
+                    self.catalog_query_field,
+                    self.catalog_query_button
+                ]),
                 ft.Divider(),
                 ft.Text(_("日志输出:"), size=18),
                 ft.Container(
@@ -347,6 +1034,11 @@ class PixivImageOrganizer:
     
     def savec(self, e):
         """保存配置"""
+        error_rate = float(self.breaker_error_rate_field.value)
+        if not 0 < error_rate <= 1:
+            self.log(_("熔断错误率需大于0且不超过1，保留原值: %s") % self.config["breaker_error_rate"], llv.WARNING)
+            error_rate = self.config["breaker_error_rate"]
+            self.breaker_error_rate_field.value = str(error_rate)
         self.config.update({
             "source_dir": self.source_dir_field.value,
             "target_dir": self.target_dir_field.value,
@@ -357,6 +1049,7 @@ class PixivImageOrganizer:
             "pixiv_cookie": self.pixiv_cookie_field.value,
             "file_extensions": [ext.strip() for ext in self.file_extensions_field.value.split(",")],
             "overwrite_existing": self.overwrite_check.value,
+            "relocate_existing": self.relocate_check.value,
             "max_retries": int(self.max_retries_field.value),
             "base_retry_delay": int(self.base_retry_delay_field.value),
             "max_retry_delay": int(self.max_retry_delay_field.value),
@@ -365,10 +1058,16 @@ class PixivImageOrganizer:
             "retry_on_429": self.retry_429_check.value,
             "retry_on_timeout": self.retry_timeout_check.value,
             "thread_count": int(self.thread_count_field.value),
+            "request_interval": float(self.request_interval_field.value),
+            "breaker_error_rate": error_rate,
+            "breaker_window": int(self.breaker_window_field.value),
+            "breaker_cooldown": int(self.breaker_cooldown_field.value),
+            "breaker_action": self.breaker_action_dropdown.value,
             "log_to_file": self.log_to_file_check.value,
             "log_file_path": self.log_file_path_field.value,
             "log_level": self.log_level_dropdown.value,
-            "clear_log_on_startup": self.clear_log_check.value
+            "clear_log_on_startup": self.clear_log_check.value,
+            "enable_profiling": self.profiling_check.value
         })
         
         try:
@@ -386,22 +1085,23 @@ class PixivImageOrganizer:
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         log_entry = f"[{now}] [{level}] {message}"
         
-        # 显示在UI中
-        self.log_output.controls.append(ft.Text(log_entry))
-        self.page.update()
-        self.log_output.scroll_to(offset=-1, duration=100)
+        with self.log_lock:
+            # 显示在UI中
+            self.log_output.controls.append(ft.Text(log_entry))
+            self.page.update()
+            self.log_output.scroll_to(offset=-1, duration=100)
         
-        # 记录到文件
-        if self.config.get("log_to_file", False):
-            try:
-                current_level = llv[self.config.get("log_level", "INFO")]
-                if level >= current_level:  # 比较枚举值
-                    log_path = Path(self.config.get("log_file_path", "pixsense.log"))
-                    log_path.parent.mkdir(parents=True, exist_ok=True)
-                    with open(log_path, "a", encoding="utf-8") as f:
-                        f.write(log_entry + "\n")
-            except Exception as e:
-                self.log(_("无法写入日志文件: %s") % str(e), llv.ERROR)
+            # 记录到文件
+            if self.config.get("log_to_file", False):
+                try:
+                    current_level = llv[self.config.get("log_level", "INFO")]
+                    if level >= current_level:  # 比较枚举值
+                        log_path = Path(self.config.get("log_file_path", "pixsense.log"))
+                        log_path.parent.mkdir(parents=True, exist_ok=True)
+                        with open(log_path, "a", encoding="utf-8") as f:
+                            f.write(log_entry + "\n")
+                except Exception as e:
+                    self.log(_("无法写入日志文件: %s") % str(e), llv.ERROR)
 
     def loadc(self):
         """加载保存的配置"""
@@ -418,6 +1118,27 @@ class PixivImageOrganizer:
         # 更新配置
         self.savec(None)
         
+        if not self.config.get("enable_profiling", False):
+            self.organize()
+            return
+        
+        profiler = RunProfiler()
+        try:
+            try:
+                profiler.start()
+            except Exception as e:
+                self.log(_("启动性能分析失败: %s") % str(e), llv.ERROR)
+            self.organize()
+        finally:
+            try:
+                output_dir = Path(self.config.get("log_file_path", "pixsense.log")).parent
+                for path in profiler.stop(output_dir):
+                    self.log(_("性能分析结果已保存: %s") % path)
+            except Exception as e:
+                self.log(_("保存性能分析结果失败: %s") % str(e), llv.ERROR)
+    
+    def organize(self):
+        """扫描源目录并整理图片"""
         # 验证配置
         if not self.config["source_dir"] or not os.path.isdir(self.config["source_dir"]):
             self.log(_("错误: 源目录无效或未设置"), llv.ERROR)
@@ -427,12 +1148,18 @@ class PixivImageOrganizer:
             self.log(_("错误: 目标目录未设置"), llv.ERROR)
             return
             
-        if not self.config["pixiv_cookie"]:
+        if not CookiePool.parse(self.config["pixiv_cookie"]):
             self.log(_("警告: 未设置Pixiv Cookie，可能无法获取详细信息"), llv.WARNING)
             
         # 创建目标目录
         os.makedirs(self.config["target_dir"], exist_ok=True)
         
+        # 建立目标目录索引
+        count = self.target_index.build(
+            self.config["target_dir"], self.config["file_extensions"], self.config["source_dir"]
+        )
+        self.log(_("目标目录中已有 %d 个文件") % count, llv.DEBUG)
+        
         self.log(_("开始扫描源目录..."), llv.DEBUG)
         
         # 获取所有图片文件
@@ -442,82 +1169,266 @@ class PixivImageOrganizer:
         
         self.log(_("找到 %d 个图片文件") % len(image_files))
         
-        # 处理每个文件
+        # 按作品ID分组，同一作品只获取一次信息
+        groups: Dict[str, List[Path]] = {}
         for file in image_files:
-            try:
-                self.process_file(file)
-            except Exception as e:
-                self.log(_("处理文件 %s 时出错: %s") % (file.name,str(e)), llv.ERROR)
+            illust_id = self.extractId(file.stem)
+            if not illust_id:
+                self.log(_("无法从文件名 %s 中提取ID") % file.stem, llv.ERROR)
+                continue
+            groups.setdefault(illust_id, []).append(file)
+        
+        # 按获取成本分类：缓存命中的作品无需联网
+        local_items, remote_ids = [], []
+        for illust_id, files in groups.items():
+            cached = self.metadata_cache.get(illust_id)
+            if self.metadata_cache.is_fresh(cached):
+                local_items.extend((file, illust_id, cached["body"]) for file in files)
+            else:
+                remote_ids.append(illust_id)
+        self.log(_("缓存命中 %d 个作品，需要联网获取 %d 个作品") % (len(groups) - len(remote_ids), len(remote_ids)))
+        
+        self.cookie_pool = self.make_cookie_pool()
+        self.breaker = self.make_breaker()
+        if len(self.cookie_pool.sessions) > 1:
+            self.log(_("Cookie池中共有 %d 个会话") % len(self.cookie_pool.sessions))
+        # 每个会话至少需要一个线程才能并行请求
+        workers = max(1, self.config["thread_count"], len(self.cookie_pool.sessions))
+        self.catalog = self.open_catalog()
+        try:
+            self.run_schedule(groups, local_items, remote_ids, workers)
+        finally:
+            if self.catalog:
+                self.catalog.close()
+                self.catalog = None
         
         self.log(_("整理完成!"))
     
-    def process_file(self, file_path: Path):
-        """处理单个文件"""
-        try:
-            filename = file_path.stem
-            self.log(_("处理文件: %s") % filename, llv.DEBUG)
+    def run_schedule(self, groups: Dict[str, List[Path]], local_items: List[tuple], remote_ids: List[str], workers: int):
+        """并行获取作品信息，同时按目录分组放置文件"""
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # 联网请求按限速节奏在后台进行
+            futures = {pool.submit(self.getInfo, illust_id): illust_id for illust_id in remote_ids}
             
-            illust_id = self.extractId(filename)
-            if not illust_id:
-                self.log(_("无法从文件名 %s 中提取ID") % filename, llv.ERROR)
-                return
-                
-            self.log(_("提取到ID: %s") % illust_id, llv.DEBUG)
+            # 同时全速放置缓存命中的文件
+            self.place_batch(local_items)
             
-            illust_info = self.getInfo(illust_id)
-            if not illust_info:
-                return
-                
-            # 验证illust_info数据结构
-            if not isinstance(illust_info, dict):
-                self.log(_("作品信息格式无效: %s") % type(illust_info), llv.ERROR)
-                return
-                
-            # 安全访问嵌套数据
-            title = str(illust_info.get("illustTitle", _("无标题")))
-            user_name = str(illust_info.get("userName", _("未知用户")))
+            batch = []
+            for future in as_completed(futures):
+                illust_id = futures[future]
+                try:
+                    illust_info = future.result()
+                except Exception as e:
+                    self.log(_("获取作品 %s 信息时出错: %s") % (illust_id, str(e)), llv.ERROR)
+                    continue
+                if not illust_info:
+                    continue
+                batch.extend((file, illust_id, illust_info) for file in groups[illust_id])
+                if len(batch) >= self.place_batch_size:
+                    self.place_batch(batch)
+                    batch = []
+            self.place_batch(batch)
+    
+    def place_batch(self, items: List[tuple]):
+        """按目标目录分组放置一批文件"""
+        targets = []
+        for file_path, illust_id, illust_info in items:
+            try:
+                metadata = self.normalize_info(illust_id, illust_info)
+                if not metadata:
+                    continue
+                target_path = self.buildPath(metadata, file_path.suffix)
+                if target_path:
+                    targets.append((target_path, file_path, metadata))
+            except Exception as e:
+                self.log(_("处理文件 %s 时出错: %s") % (file_path.name,str(e)), llv.ERROR)
+        
+        # 同一目录的文件连续写入，提高磁盘局部性
+        targets.sort(key=lambda t: (str(t[0].parent), t[0].name))
+        for target_path, file_path, metadata in targets:
+            try:
+                self.place_file(file_path, target_path, metadata)
+            except Exception as e:
+                self.log(_("处理文件 %s 时出错: %s") % (file_path.name,str(e)), llv.ERROR)
+                import traceback
+                self.log(_("错误详情:\n%s") % traceback.format_exc(), llv.DEBUG)
+        if self.catalog:
+            self.catalog.commit()
+    
+    def normalize_info(self, illust_id: str, illust_info: Any) -> Optional[Dict]:
+        """整理作品信息为构建路径所需的字段"""
+        # 验证illust_info数据结构
+        if not isinstance(illust_info, dict):
+            self.log(_("作品信息格式无效: %s") % type(illust_info), llv.ERROR)
+            return None
             
-            # 处理tags数据
-            tags_data = illust_info.get("tags", {})
-            if not isinstance(tags_data, dict):
-                tags_data = {}
-                
-            tags_list = tags_data.get("tags", [])
-            if not isinstance(tags_list, list):
-                tags_list = []
-                
-            # 构建目标路径
-            target_path = self.buildPath({
-                "illustId": illust_id,
-                "illustTitle": title,
-                "userName": user_name,
-                "userId": str(illust_info.get("userId", "")),
-                "createDate": illust_info.get("createDate", ""),
-                "bookmarkCount": illust_info.get("bookmarkCount", 0),
-                "tags": {"tags": tags_list}
-            }, file_path.suffix)
+        # 安全访问嵌套数据
+        title = str(illust_info.get("illustTitle", _("无标题")))
+        user_name = str(illust_info.get("userName", _("未知用户")))
+        
+        # 处理tags数据
+        tags_data = illust_info.get("tags", {})
+        if not isinstance(tags_data, dict):
+            tags_data = {}
             
-            if not target_path:
+        tags_list = tags_data.get("tags", [])
+        if not isinstance(tags_list, list):
+            tags_list = []
+            
+        return {
+            "illustId": illust_id,
+            "illustTitle": title,
+            "userName": user_name,
+            "userId": str(illust_info.get("userId", "")),
+            "createDate": illust_info.get("createDate", ""),
+            "bookmarkCount": illust_info.get("bookmarkCount", 0),
+            "tags": {"tags": tags_list}
+        }
+    
+    def place_file(self, file_path: Path, target_path: Path, metadata: Optional[Dict] = None):
+        """将文件复制到目标路径"""
+        import shutil
+        # 同一作品已整理到其他目录
+        elsewhere = self.target_index.elsewhere(target_path)
+        if elsewhere and not self.target_index.exists(target_path):
+            if not self.config["relocate_existing"]:
+                self.log(_("作品已整理到其他位置，跳过: %s") % elsewhere[0])
+                self.catalog_file(elsewhere[0], file_path, metadata, placed=False)
                 return
-                    
-            # 创建目录并复制/移动文件
             os.makedirs(target_path.parent, exist_ok=True)
-            
-            if target_path.exists() and not self.config["overwrite_existing"]:
-                self.log(_("文件已存在，跳过: %s") % target_path)
+            move = lambda: shutil.move(str(elsewhere[0]), str(target_path))
+            if self.catalog:
+                self.catalog.move(elsewhere[0], target_path, move)
+            else:
+                move()
+            self.target_index.remove(elsewhere[0])
+            self.target_index.add(target_path)
+            self.log(_("已将 %s 移动到: %s") % (elsewhere[0], target_path))
+            if not self.config["overwrite_existing"]:
+                self.catalog_file(target_path, file_path, metadata, placed=False)
                 return
-                
-            self.log(_("文件路径：%s") % str(file_path), llv.DEBUG)
-            self.log(_("目标路径：%s") % str(target_path), llv.DEBUG)
-            # 复制文件
-            import shutil
-            shutil.copy2(file_path, target_path)
-            self.log(_("文件已复制到: %s") % target_path)
-
+        
+        if self.target_index.exists(target_path) and not self.config["overwrite_existing"]:
+            self.log(_("文件已存在，跳过: %s") % target_path)
+            self.catalog_file(target_path, file_path, metadata, placed=False)
+            return
+            
+        self.log(_("文件路径：%s") % str(file_path), llv.DEBUG)
+        self.log(_("目标路径：%s") % str(target_path), llv.DEBUG)
+        # 创建目录并复制文件
+        os.makedirs(target_path.parent, exist_ok=True)
+        shutil.copy2(file_path, target_path)
+        self.target_index.add(target_path)
+        self.catalog_file(target_path, file_path, metadata)
+        self.log(_("文件已复制到: %s") % target_path)
+    
+    def catalog_file(self, target_path: Path, file_path: Path, metadata: Optional[Dict], placed: bool = True):
+        """将已整理的文件登记到目录数据库；跳过的文件只更新作品信息"""
+        if not self.catalog or not metadata:
+            return
+        match = re.search(r"_p(\d+)", file_path.stem)
+        try:
+            if placed:
+                self.catalog.record(target_path, file_path, int(match.group(1)) if match else 0, metadata)
+            else:
+                self.catalog.refresh(target_path, metadata)
+        except Exception as e:
+            self.log(_("登记目录失败: %s") % str(e), llv.WARNING)
+    
+    def open_catalog(self) -> Optional[LibraryCatalog]:
+        """打开目录数据库"""
+        try:
+            return LibraryCatalog(self.config["catalog_path"])
         except Exception as e:
-            self.log(_("处理文件 %s 时出错: %s") % (file_path.name,str(e)), llv.ERROR)
-            import traceback
-            self.log(_("错误详情:\n%s") % traceback.format_exc(), llv.DEBUG)
+            self.log(_("打开目录数据库失败: %s") % str(e), llv.ERROR)
+            return None
+    
+    def relayout(self, e):
+        """根据目录数据库按当前文件夹结构重新布局，无需重新获取信息"""
+        import shutil
+        self.savec(None)
+        if not self.config["target_dir"]:
+            self.log(_("错误: 目标目录未设置"), llv.ERROR)
+            return
+        catalog = self.open_catalog()
+        if not catalog:
+            return
+        
+        root = Path(self.config["target_dir"])
+        moved = skipped = removed = 0
+        try:
+            for row in catalog.all_files():
+                old_path = Path(row["target_path"])
+                try:
+                    # 文件已被删除或移走，清除失效记录以免查询返回不存在的路径
+                    if not old_path.exists():
+                        catalog.remove(old_path)
+                        removed += 1
+                        self.log(_("文件已不存在，清除目录记录: %s") % old_path, llv.WARNING)
+                        continue
+                    if not old_path.is_relative_to(root):
+                        self.log(_("文件不在当前目标目录中，跳过: %s") % old_path, llv.INFO)
+                        skipped += 1
+                        continue
+                    metadata = json.loads(row["metadata"])
+                    new_dir = self.buildPath(metadata, old_path.suffix)
+                    if not new_dir:
+                        skipped += 1
+                        continue
+                    # 保留原文件名，只调整所在目录
+                    new_path = new_dir.parent / old_path.name
+                    if new_path == old_path:
+                        continue
+                    if new_path.exists():
+                        self.log(_("文件已存在，跳过: %s") % new_path, llv.WARNING)
+                        skipped += 1
+                        continue
+                    new_path.parent.mkdir(parents=True, exist_ok=True)
+                    catalog.move(old_path, new_path, lambda: shutil.move(str(old_path), str(new_path)))
+                    self.prune_empty_dirs(old_path.parent, root)
+                    moved += 1
+                    self.log(_("已将 %s 移动到: %s") % (old_path, new_path), llv.DEBUG)
+                except Exception as e:
+                    self.log(_("处理文件 %s 时出错: %s") % (old_path.name, str(e)), llv.ERROR)
+                    skipped += 1
+        finally:
+            catalog.close()
+        self.log(_("重新布局完成: 移动 %d 个文件，跳过 %d 个文件，清除 %d 条失效记录") % (moved, skipped, removed))
+    
+    def prune_empty_dirs(self, directory: Path, root: Path):
+        """删除重新布局后留下的空目录"""
+        while directory != root and directory.is_relative_to(root):
+            try:
+                directory.rmdir()
+            except OSError:
+                return
+            directory = directory.parent
+    
+    def query_catalog(self, e):
+        """查询目录数据库"""
+        kind = self.catalog_query_dropdown.value
+        value = (self.catalog_query_field.value or "").strip()
+        if not value:
+            return
+        catalog = self.open_catalog()
+        if not catalog:
+            return
+        try:
+            if kind == "tag":
+                rows = catalog.by_tag(value)
+            elif kind == "date":
+                start, _sep, end = value.partition("~")
+                rows = catalog.by_date(start.strip(), (end or start).strip())
+            else:
+                rows = catalog.by_user(value)
+        finally:
+            catalog.close()
+        
+        self.log(_("查询到 %d 个文件") % len(rows))
+        for row in rows[:self.query_result_limit]:
+            self.log(row["target_path"])
+        if len(rows) > self.query_result_limit:
+            self.log(_("仅显示前 %d 个结果") % self.query_result_limit)
     
     def extractId(self, filename: str) -> Optional[str]:
         """从文件名中提取Pixiv ID"""
@@ -553,47 +1464,138 @@ class PixivImageOrganizer:
         
         return None
     
+    def make_cookie_pool(self) -> CookiePool:
+        """根据配置创建Cookie池"""
+        return CookiePool(
+            self.config["pixiv_cookie"],
+            self.config["request_interval"],
+            self.config["cookie_cooldown"],
+            self.config["cookie_max_auth_failures"]
+        )
+
+    def penalize_sessions(self, sessions: set):
+        """作品已由其他会话成功获取时，将对其返回401/403的会话计入认证失败"""
+        for session in sessions:
+            if self.cookie_pool.penalize(session):
+                self.log(_("Cookie %s 认证持续失败，已移出轮换") % session.label, llv.CRITICAL)
+                if not self.cookie_pool.alive_count():
+                    self.log(_("所有Pixiv Cookie均已失效，请更新Cookie"), llv.CRITICAL)
+
+    def make_breaker(self) -> CircuitBreaker:
+        """根据配置创建熔断器"""
+        return CircuitBreaker(
+            self.config["breaker_error_rate"],
+            self.config["breaker_window"],
+            self.config["breaker_cooldown"]
+        )
+
+    def record_outcome(self, token: object, failure: Optional[str] = None):
+        """记录请求结果并报告熔断器状态变化"""
+        state = self.breaker.record(token, failure)
+        if state == CircuitBreaker.CLOSED:
+            self.log(_("Pixiv请求已恢复正常"), llv.INFO)
+        elif state == CircuitBreaker.OPEN:
+            if self.breaker.reason == "auth":
+                self.log(_("认证持续失败，Pixiv Cookie可能已失效，请更新Cookie"), llv.CRITICAL)
+            else:
+                self.log(_("Pixiv服务持续异常，已暂停请求"), llv.ERROR)
+            if self.config["breaker_action"] == "cache_only":
+                self.log(_("熔断期间仅放置已缓存的作品，%d 秒后探测恢复") % self.config["breaker_cooldown"], llv.WARNING)
+            else:
+                self.log(_("暂停整理，%d 秒后探测恢复") % self.config["breaker_cooldown"], llv.WARNING)
+
     def getInfo(self, illust_id: str) -> Optional[Dict]:
         """通过Pixiv API获取作品信息"""
-        if not self.config["pixiv_cookie"]:
+        cached = self.metadata_cache.get(illust_id)
+        if self.metadata_cache.is_fresh(cached):
+            self.log(_("使用缓存的作品信息: %s") % illust_id, llv.DEBUG)
+            return cached["body"]
+            
+        if not self.cookie_pool.sessions:
             self.log(_("未设置Pixiv Cookie"), llv.WARNING)
-            return None
+            return cached["body"] if cached else None
             
         url = f"https://www.pixiv.net/ajax/illust/{illust_id}"
         headers = {
             "User-Agent": "Mozilla/5.0",
-            "Cookie": self.config["pixiv_cookie"],
-            "Referer": f"https://www.pixiv.net/artworks/{illust_id}"
+            "Referer": f"https://www.pixiv.net/artworks/{illust_id}",
+            # requests的默认值已包含当前环境可解码的压缩格式(gzip/br/zstd)
+            "Accept-Encoding": requests.utils.DEFAULT_ACCEPT_ENCODING
         }
+        # 缓存过期时发送条件请求
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
         
         response = None  # 初始化response变量
         last_status = None
         retries = 0
+        rejected = set()  # 对该作品返回401/403的会话
         
         while retries < self.config["max_retries"]:
-            try:
-                # 添加随机延迟避免请求过于频繁
-                if retries > 0:
-                    delay = self.calculate_retry_delay(retries)
-                    self.log(_("等待 %.2f 秒后重试...") % delay, llv.DEBUG)
-                    time.sleep(delay)
+            # 添加随机延迟避免请求过于频繁
+            if retries > 0:
+                delay = self.calculate_retry_delay(retries)
+                self.log(_("等待 %.2f 秒后重试...") % delay, llv.DEBUG)
+                time.sleep(delay)
+            
+            # 熔断器打开时不再发出请求
+            token = self.breaker.allow()
+            if token is None:
+                if self.config["breaker_action"] == "cache_only":
+                    self.log(_("熔断中，跳过请求: %s") % illust_id, llv.DEBUG)
+                    return cached["body"] if cached else None
+                token = self.breaker.wait()
                 
-                response = requests.get(
+            try:
+                session = self.cookie_pool.acquire(exclude=rejected)
+                if session is None:
+                    if not rejected:
+                        self.log(_("没有可用的Pixiv Cookie"), llv.ERROR)
+                    break
+                response = session.http.get(
                     url,
-                    headers=headers,
+                    headers={**headers, "Cookie": session.cookie},
                     timeout=(15, 30)
                 )
                 last_status = response.status_code
+                if response.status_code != 429:
+                    self.cookie_pool.report(session, response.status_code)
+                if response.status_code >= 500:
+                    self.record_outcome(token, "error")
+                elif response.status_code in (401, 403):
+                    # 还能换用其他Cookie重试时不计入熔断器，单个Cookie的好坏由penalize判定
+                    if not self.cookie_pool.available(rejected | {session}):
+                        self.record_outcome(token, "auth")
+                elif response.status_code != 429:
+                    # 429由该Cookie冷却处理，不计入熔断器，令牌在finally中归还
+                    self.record_outcome(token)
+                
+                # 内容未变化，延长缓存有效期
+                if response.status_code == 304 and cached:
+                    self.penalize_sessions(rejected)
+                    try:
+                        self.metadata_cache.touch(illust_id, cached)
+                    except OSError as e:
+                        self.log(_("写入缓存失败: %s") % str(e), llv.WARNING)
+                    self.log(_("作品信息未变化，沿用缓存: %s") % illust_id, llv.DEBUG)
+                    return cached["body"]
                 
                 # 处理429状态码
                 if response.status_code == 429:
-                    retry_after = self.handle_rate_limit(response)
+                    retry_after = self.handle_rate_limit(response, session)
                     continue
                     
                 # 处理其他错误状态码
                 if response.status_code != 200:
                     self.handle_http_error(response.status_code)
-                    if response.status_code in (403, 404):
+                    if response.status_code in (401, 403):
+                        # 换用其他账号的Cookie重试
+                        rejected.add(session)
+                        continue
+                    if response.status_code == 404:
                         break
                     retries += 1
                     continue
@@ -604,14 +1606,31 @@ class PixivImageOrganizer:
                     retries += 1
                     continue
                     
-                return data.get("body")
+                self.penalize_sessions(rejected)
+                body = data.get("body")
+                try:
+                    self.metadata_cache.put(
+                        illust_id, body,
+                        response.headers.get("ETag"),
+                        response.headers.get("Last-Modified")
+                    )
+                except OSError as e:
+                    self.log(_("写入缓存失败: %s") % str(e), llv.WARNING)
+                return body
                 
             except requests.exceptions.RequestException as e:
                 self.log(_("API请求异常: %s: %s") % (type(e).__name__, str(e)), llv.ERROR)
+                self.record_outcome(token, "error")
                 retries += 1
+            finally:
+                # 任何退出路径都归还令牌，避免探测名额被一直占用
+                self.breaker.release(token)
         
         # 最终失败处理
         self.log_final_failure(illust_id, last_status)
+        if cached:
+            self.log(_("使用过期的缓存信息: %s") % illust_id, llv.WARNING)
+            return cached["body"]
         return None
 
     def calculate_retry_delay(self, retries: int) -> float:
@@ -625,14 +1644,14 @@ class PixivImageOrganizer:
             delay += random.uniform(0, 1)
         return delay
 
-    def handle_rate_limit(self, response) -> int:
-        """处理速率限制"""
+    def handle_rate_limit(self, response, session: CookieSession) -> int:
+        """处理速率限制，该会话冷却期间由其他会话继续请求"""
         retry_after = int(response.headers.get('Retry-After', self.config["max_retry_delay"]))
         self.log(
             _("请求过于频繁，Pixiv要求等待 %d 秒 (HTTP 429)" % retry_after),
             llv.WARNING
         )
-        time.sleep(retry_after)
+        self.cookie_pool.report(session, 429, retry_after)
         return retry_after
 
     def handle_http_error(self, status_code: int):